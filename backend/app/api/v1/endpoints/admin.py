@@ -538,7 +538,7 @@ async def update_setting(
         # Clear cache if settings service is used
         try:
             from app.services.settings_service import settings_service
-            settings_service.clear_cache()
+            settings_service.invalidate()
         except:
             pass
         
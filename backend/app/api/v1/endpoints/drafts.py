@@ -173,7 +173,7 @@ async def confirm_po(
                 "created_at": datetime.utcnow().isoformat()
             }
             
-            redis_service.set_draft_session(session_key, session_data)
+            await redis_service.set_draft_session(session_key, session_data)
             
             return ConfirmPOResponse(
                 doc_id=doc_id,
@@ -243,7 +243,7 @@ async def match_items(
         
         # Get draft session from Redis
         session_key = get_session_key(doc_id)
-        session_data = redis_service.get_draft_session(session_key)
+        session_data = await redis_service.get_draft_session(session_key)
         
         if not session_data:
             logger.error(f"Draft session not found for doc {doc_id}")
@@ -371,7 +371,13 @@ async def match_items(
         # Store match result in session for later use
         session_data["matched_items"] = [m.dict() for m in matched_items]
         session_data["unmatched_items"] = unmatched_bill_items
-        redis_service.set_draft_session(session_key, session_data)
+        match_fields = {
+            "matched_items": session_data["matched_items"],
+            "unmatched_items": unmatched_bill_items
+        }
+        if not await redis_service.set_draft_session_fields(session_key, match_fields):
+            # Session expired or is a legacy single-blob session; rewrite it whole
+            await redis_service.set_draft_session(session_key, session_data)
         
         return MatchItemsResponse(
             doc_id=doc_id,
@@ -418,7 +424,7 @@ async def save_draft(
         
         # Get draft session from Redis
         session_key = get_session_key(doc_id)
-        session_data = redis_service.get_draft_session(session_key)
+        session_data = await redis_service.get_draft_session(session_key)
         
         if not session_data:
             raise HTTPException(
@@ -551,7 +557,7 @@ async def save_draft(
             }).eq("id", doc_id).execute()
             
             # Clear draft session from Redis
-            redis_service.delete_draft_session(session_key)
+            await redis_service.delete_draft_session(session_key)
             
             logger.info(f"Created draft bill {draft_bill_id} with {len(items_data)} items")
             
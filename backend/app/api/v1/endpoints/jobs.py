@@ -143,22 +143,23 @@ async def create_job(
         # Enqueue Celery task for processing
         try:
             # #region agent log
-            from app.workers.celery_app import celery_app
-            api_broker = getattr(celery_app.conf, 'broker_url', None) or getattr(celery_app, 'broker', None)
-            api_transport_opts = getattr(celery_app.conf, 'broker_transport_options', {})
-            logger.info(f"[DEBUG-HYP-B] About to enqueue task - job_id: {job_id}, API broker URL: {api_broker}")
-            logger.info(f"[DEBUG-HYP-F] API broker_transport_options: {api_transport_opts}")
-            logger.info(f"[DEBUG-HYP-F] API celery_app.broker attribute: {getattr(celery_app, 'broker', 'NOT_SET')}")
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            if debug_enabled:
+                from app.workers.celery_app import celery_app
+                api_broker = getattr(celery_app.conf, 'broker_url', None) or getattr(celery_app, 'broker', None)
+                logger.debug("[DEBUG-HYP-B] About to enqueue task - job_id: %s, API broker URL: %s", job_id, api_broker)
+                logger.debug("[DEBUG-HYP-F] API broker_transport_options: %s", getattr(celery_app.conf, 'broker_transport_options', {}))
             # #endregion
             result = process_job_task.delay(job_id)
             # #region agent log
-            logger.info(f"[DEBUG-HYP-B] Task enqueued - job_id: {job_id}, task_id: {result.id if result else None}, task_state: {result.state if result else None}")
-            logger.info(f"[DEBUG-HYP-F] Task sent to queue: celery (exchange=celery, routing_key=celery)")
+            if debug_enabled:
+                # result.state is a result-backend round-trip, so only read it when debugging
+                logger.debug("[DEBUG-HYP-B] Task enqueued - job_id: %s, task_id: %s, task_state: %s", job_id, result.id, result.state)
             # #endregion
             logger.info(f"[{request_id}] Job task enqueued: {job_id}")
         except Exception as e:
             # #region agent log
-            logger.error(f"[DEBUG-HYP-C] Failed to enqueue - job_id: {job_id}, error: {str(e)}, type: {type(e).__name__}", exc_info=True)
+            logger.debug("[DEBUG-HYP-C] Failed to enqueue - job_id: %s, error type: %s", job_id, type(e).__name__)
             # #endregion
             logger.error(f"[{request_id}] Failed to enqueue task: {str(e)}", exc_info=True)
             # Job is created, but task might fail - status will remain IN_QUEUE
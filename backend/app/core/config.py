@@ -17,6 +17,11 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     OPENAI_API_KEY: str
     
+    # Page classification backend: "openai" (Vision API) or "local" (int8 ONNX model on CPU)
+    CLASSIFICATION_BACKEND: str = "openai"
+    CLASSIFIER_MODEL_PATH: str = "models/classifier.int8.onnx"
+    CLASSIFIER_LABELS: List[str] = ["bill", "eway_bill", "unknown"]  # Model output order
+    
     # Redis & Celery Configuration
     REDIS_URL: str = "redis://localhost:6379/0"
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
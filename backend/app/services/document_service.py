@@ -1,8 +1,11 @@
 """Service for document processing (PDF splitting, image conversion)"""
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_path
 import logging
+import os
+import tempfile
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
@@ -41,6 +44,13 @@ class DocumentService:
             logger.error(f"Failed to split PDF: {str(e)}", exc_info=True)
             raise
     
+    def _render_pdf_page(self, pdf_path: str, page_number: int) -> bytes:
+        """Render a single PDF page (1-indexed) to PNG bytes"""
+        image = convert_from_path(pdf_path, dpi=200, fmt='png', first_page=page_number, last_page=page_number)[0]
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+    
     def convert_image_to_bytes(self, image_bytes: bytes, target_format: str = 'PNG') -> bytes:
         """
         Convert image bytes to specified format.
@@ -102,8 +112,41 @@ class DocumentService:
             pages.append((1, page_bytes))
         
         return pages
+    
+    def iter_image_bytes_for_classification(self, file_bytes: bytes, file_extension: str) -> Iterator[Tuple[int, bytes]]:
+        """
+        Lazily yield image bytes for classification/OCR processing.
+        
+        Like get_image_bytes_for_classification, but PDF pages are rendered one
+        at a time: the next page renders on a background thread while the caller
+        handles the current one, so only about two pages are held in memory.
+        
+        Args:
+            file_bytes: File content as bytes
+            file_extension: File extension (.pdf, .png, .jpg, .jpeg)
+        
+        Yields:
+            Tuples of (page_number (1-indexed), image_bytes)
+        """
+        if file_extension.lower() != '.pdf':
+            yield from self.get_image_bytes_for_classification(file_bytes, file_extension)
+            return
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf_path = os.path.join(temp_dir, "document.pdf")
+            with open(pdf_path, "wb") as pdf_file:
+                pdf_file.write(file_bytes)
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                next_page = executor.submit(self._render_pdf_page, pdf_path, 1) if page_count else None
+                for page_number in range(1, page_count + 1):
+                    page_bytes = next_page.result()
+                    if page_number < page_count:
+                        next_page = executor.submit(self._render_pdf_page, pdf_path, page_number + 1)
+                    logger.info("Converted page %s to PNG (%s bytes)", page_number, len(page_bytes))
+                    yield page_number, page_bytes
 
 
 # Singleton instance
 document_service = DocumentService()
-
@@ -0,0 +1,79 @@
+"""Service for classifying document pages with a local int8 ONNX model"""
+from typing import List, Optional
+from io import BytesIO
+from PIL import Image
+from app.core.config import settings
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Input size and ImageNet normalization used when exporting the classifier
+_INPUT_SIZE = 224
+_MEAN = (0.485, 0.456, 0.406)
+_STD = (0.229, 0.224, 0.225)
+
+
+class LocalClassifierService:
+    """
+    Service for 3-way page classification ('bill', 'eway_bill', 'unknown') on CPU.
+
+    onnxruntime and numpy are only imported when this backend is enabled
+    (CLASSIFICATION_BACKEND=local), so the default OpenAI backend does not
+    need them installed.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._input_name: Optional[str] = None
+        self._lock = threading.Lock()
+        self.labels: List[str] = settings.CLASSIFIER_LABELS
+
+    def _get_session(self):
+        """Lazy-load the ONNX Runtime session on first use"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    try:
+                        import onnxruntime as ort
+                    except ImportError as e:
+                        raise Exception(
+                            "CLASSIFICATION_BACKEND=local requires onnxruntime and numpy to be installed"
+                        ) from e
+                    session = ort.InferenceSession(
+                        settings.CLASSIFIER_MODEL_PATH,
+                        providers=["CPUExecutionProvider"]
+                    )
+                    self._input_name = session.get_inputs()[0].name
+                    self._session = session
+                    logger.info("Local classifier loaded from %s", settings.CLASSIFIER_MODEL_PATH)
+        return self._session
+
+    def _preprocess(self, image_bytes: bytes):
+        """Convert image bytes to a normalized 1x3xHxW float32 tensor"""
+        import numpy as np
+
+        image = Image.open(BytesIO(image_bytes)).convert("RGB")
+        image = image.resize((_INPUT_SIZE, _INPUT_SIZE), Image.BILINEAR)
+        arr = np.asarray(image, dtype=np.float32) / 255.0
+        arr = (arr - np.array(_MEAN, dtype=np.float32)) / np.array(_STD, dtype=np.float32)
+        return arr.transpose(2, 0, 1)[np.newaxis, ...]
+
+    def classify(self, image_bytes: bytes) -> str:
+        """
+        Classify a page image.
+
+        Args:
+            image_bytes: Image bytes (PNG/JPEG)
+
+        Returns:
+            Classification result: 'bill', 'eway_bill', or 'unknown'
+        """
+        session = self._get_session()
+        logits = session.run(None, {self._input_name: self._preprocess(image_bytes)})[0]
+        label = self.labels[int(logits[0].argmax())]
+        return label if label in ('bill', 'eway_bill') else 'unknown'
+
+
+# Singleton instance
+local_classifier_service = LocalClassifierService()
@@ -1,33 +1,144 @@
 """Service for OpenAI API interactions (classification and OCR)"""
-from typing import Dict, Any, Optional
-from openai import OpenAI
+from typing import Dict, Any, Optional, Tuple
+from openai import AsyncOpenAI
 from app.core.config import settings
 from app.services.settings_service import settings_service
+from app.services.local_classifier_service import local_classifier_service
+import asyncio
+import hashlib
 import logging
-import base64
+import orjson
+import pybase64
+import weakref
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+# Bump when the built-in default prompts or response handling change, so cached page results are not reused
+RESULT_FORMAT_VERSION = 1
+
+# 'llm' settings that shape classification/OCR output (fuzzy matching settings don't affect pages)
+PAGE_RESULT_SETTINGS = (
+    "classification_prompt",
+    "classification_model",
+    "ocr_prompt",
+    "bill_ocr_prompt",
+    "eway_bill_ocr_prompt",
+    "ocr_model",
+)
+
 
 class OpenAIService:
     """Service for OpenAI API interactions"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # event loop -> AsyncOpenAI client; see `client`
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+        # Static request parameters; only model, prompt and image vary per call
+        self._classify_template: Dict[str, Any] = {"max_tokens": 10, "temperature": 0}
+        self._ocr_template: Dict[str, Any] = {
+            "max_tokens": 4000,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+        }
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        AsyncOpenAI client for the running event loop.
+        
+        The client pools HTTP connections so concurrent page calls share TLS
+        sessions, but that pool is bound to the loop that opened it. Each loop
+        (one per worker thread, see tasks._run_async) therefore gets its own client.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=2, timeout=60)
+            self._clients[loop] = client
+        return client
+    
+    def prompt_version(self, llm_settings: Dict[str, str]) -> str:
+        """
+        Fingerprint of everything that shapes classification/OCR output: the
+        classification/OCR prompts and models, the classification backend and
+        RESULT_FORMAT_VERSION. Used to key cached page results.
+        
+        Args:
+            llm_settings: The 'llm' settings snapshot the pages are processed with
+        """
+        fingerprint = orjson.dumps(
+            {
+                "format": RESULT_FORMAT_VERSION,
+                "backend": settings.CLASSIFICATION_BACKEND,
+                "classifier_model": settings.CLASSIFIER_MODEL_PATH,
+                "llm": {key: llm_settings.get(key) for key in PAGE_RESULT_SETTINGS},
+            },
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(fingerprint).hexdigest()[:32]
     
-    def classify_document(self, image_bytes: bytes, file_name: str = "document.png") -> str:
+    def _encode_image(self, image_bytes: bytes, file_name: str) -> Tuple[str, str]:
+        """
+        Base64-encode image bytes for the Vision API.
+        
+        Returns:
+            Tuple of (base64_str, mime_type)
+        """
+        base64_image = pybase64.b64encode(image_bytes).decode('utf-8')
+        # Pages are rendered as PNG, so anything that isn't a JPEG is sent as PNG
+        mime_type = "image/jpeg" if file_name.lower().endswith(('.jpg', '.jpeg')) else "image/png"
+        return base64_image, mime_type
+    
+    def build_data_url(self, image_bytes: bytes, file_name: str = "document.png") -> str:
+        """
+        Build the data URL for an image so it can be encoded once and shared
+        between classification and OCR.
+        """
+        base64_image, mime_type = self._encode_image(image_bytes, file_name)
+        return f"data:{mime_type};base64,{base64_image}"
+    
+    def _vision_request(self, template: Dict[str, Any], model: str, prompt: str, data_url: str) -> Dict[str, Any]:
+        """Build chat completion kwargs for a single prompt + image request"""
+        kwargs = template.copy()
+        kwargs["model"] = model
+        kwargs["messages"] = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": data_url}}
+                ]
+            }
+        ]
+        return kwargs
+    
+    async def classify_document(
+        self,
+        image_bytes: bytes,
+        file_name: str = "document.png",
+        data_url: Optional[str] = None,
+        llm_settings: Optional[Dict[str, str]] = None
+    ) -> str:
         """
         Classify a document page as 'bill', 'eway_bill', or 'unknown'.
         
         Args:
             image_bytes: Image bytes (PNG/JPEG) or first page of PDF as image
             file_name: Original file name (for context)
+            data_url: Pre-encoded image data URL (skips re-encoding if provided)
+            llm_settings: 'llm' settings snapshot to take the prompt/model from (current settings if not given)
         
         Returns:
             Classification result: 'bill', 'eway_bill', or 'unknown'
         """
         try:
+            # Local int8 ONNX classifier skips the OpenAI round-trip entirely
+            if settings.CLASSIFICATION_BACKEND == "local":
+                result = await asyncio.to_thread(local_classifier_service.classify, image_bytes)
+                logger.debug("Local classification: %s", result)
+                return result
+            
             # Get prompt and model from settings
             default_prompt = """You are a document classifier. Analyze the provided image and classify it into one of these categories:
 - 'bill': If it's an invoice or bill document
@@ -39,7 +150,8 @@ Respond with ONLY one word: 'bill', 'eway_bill', or 'unknown'. Do not include an
             try:
                 prompt = settings_service.get_llm_prompt(
                     "classification_prompt",
-                    default=default_prompt
+                    default=default_prompt,
+                    llm_settings=llm_settings
                 )
             except ValueError as e:
                 logger.error(f"Failed to get classification prompt: {str(e)}")
@@ -51,54 +163,28 @@ Respond with ONLY one word: 'bill', 'eway_bill', or 'unknown'. Do not include an
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            model = settings_service.get_llm_model("classification_model", default="gpt-4o")
+            model = settings_service.get_llm_model("classification_model", default="gpt-4o", llm_settings=llm_settings)
             
-            # Log prompt details for debugging
-            logger.info("=" * 80)
-            logger.info("CLASSIFICATION LLM REQUEST:")
-            logger.info("=" * 80)
-            logger.info(f"Using model: {model}")
-            logger.info(f"Prompt (length: {len(prompt)} characters):")
-            logger.info("-" * 80)
-            logger.info(prompt)
-            logger.info("-" * 80)
-            logger.info("=" * 80)
+            logger.debug("Classification request model=%s prompt_len=%d", model, len(prompt))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Classification prompt:\n%s", prompt)
             
-            # Convert image bytes to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            mime_type = "image/png" if file_name.endswith('.png') else "image/jpeg"
+            # Convert image bytes to base64 unless the caller already did
+            if data_url is None:
+                data_url = self.build_data_url(image_bytes, file_name)
             
             # Call OpenAI Vision API
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=10,
-                temperature=0
+            response = await self.client.chat.completions.create(
+                **self._vision_request(self._classify_template, model, prompt, data_url)
             )
             
             classification_raw = response.choices[0].message.content.strip()
             classification = classification_raw.lower()
             
-            logger.info("=" * 80)
-            logger.info("CLASSIFICATION LLM RESPONSE:")
-            logger.info("=" * 80)
-            logger.info(f"Raw response: '{classification_raw}'")
-            logger.info(f"Model: {model}")
-            logger.info(f"Tokens used: {response.usage.total_tokens if hasattr(response, 'usage') and response.usage else 'N/A'}")
-            logger.info("=" * 80)
+            logger.debug(
+                "Classification response model=%s raw=%r tokens=%s",
+                model, classification_raw, response.usage.total_tokens if response.usage else "N/A"
+            )
             
             # Normalize response
             if 'bill' in classification and 'eway' not in classification:
@@ -108,17 +194,23 @@ Respond with ONLY one word: 'bill', 'eway_bill', or 'unknown'. Do not include an
             else:
                 result = 'unknown'
             
-            logger.info(f"Classification normalized to: '{result}'")
+            logger.debug("Classification normalized to: %s", result)
             return result
                 
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"Classification failed: {error_msg}", exc_info=True)
-            print(f"Classification failed: {error_msg}")
+            logger.error("Classification failed: %s", error_msg, exc_info=logger.isEnabledFor(logging.DEBUG))
             # Re-raise exception so it can be caught and stored in job/doc
             raise Exception(f"Document classification failed: {error_msg}")
     
-    def extract_ocr_data(self, image_bytes: bytes, doc_type: str, file_name: str = "document.png") -> Dict[str, Any]:
+    async def extract_ocr_data(
+        self,
+        image_bytes: bytes,
+        doc_type: str,
+        file_name: str = "document.png",
+        data_url: Optional[str] = None,
+        llm_settings: Optional[Dict[str, str]] = None
+    ) -> Tuple[Dict[str, Any], bool]:
         """
         Extract structured data from document using OCR.
         
@@ -126,9 +218,12 @@ Respond with ONLY one word: 'bill', 'eway_bill', or 'unknown'. Do not include an
             image_bytes: Image bytes (PNG/JPEG)
             doc_type: Document type ('bill' or 'eway_bill')
             file_name: Original file name
+            data_url: Pre-encoded image data URL (skips re-encoding if provided)
+            llm_settings: 'llm' settings snapshot to take the prompts/model from (current settings if not given)
         
         Returns:
-            Dictionary with extracted OCR data
+            Tuple of (extracted OCR data, whether extraction succeeded); on failure
+            the data is {"error": ..., "raw_text": ""}
         """
         try:
             # Get prompt and model from settings
@@ -147,11 +242,12 @@ Be thorough and extract all visible information. Return only valid JSON, no othe
                 try:
                     prompt = settings_service.get_llm_prompt(
                         specific_key,
-                        default=None  # Don't use default yet, try generic key first
+                        default=None,  # Don't use default yet, try generic key first
+                        llm_settings=llm_settings
                     )
                     prompt_key = specific_key
                     prompt_source_detail = f"doc-type-specific key '{specific_key}'"
-                    logger.info(f"Found OCR prompt using {prompt_source_detail}")
+                    logger.debug("Found OCR prompt using %s", prompt_source_detail)
                 except (ValueError, KeyError):
                     # Specific key doesn't exist or is empty, will try generic key
                     pass
@@ -161,14 +257,15 @@ Be thorough and extract all visible information. Return only valid JSON, no othe
                 try:
                     prompt = settings_service.get_llm_prompt(
                         "ocr_prompt",
-                        default=default_ocr_prompt
+                        default=default_ocr_prompt,
+                        llm_settings=llm_settings
                     )
                     prompt_key = "ocr_prompt"
                     if prompt == default_ocr_prompt:
                         prompt_source_detail = "generic 'ocr_prompt' (empty, using DEFAULT)"
                     else:
                         prompt_source_detail = "generic 'ocr_prompt' (CUSTOM from database)"
-                    logger.info(f"Using OCR prompt from {prompt_source_detail}")
+                    logger.debug("Using OCR prompt from %s", prompt_source_detail)
                 except ValueError as e:
                     logger.error(f"Failed to get OCR prompt: {str(e)}")
                     raise Exception(f"OCR prompt not configured: {str(e)}. Please configure it in Settings.")
@@ -179,80 +276,56 @@ Be thorough and extract all visible information. Return only valid JSON, no othe
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            model = settings_service.get_llm_model("ocr_model", default="gpt-4o")
-            
-            # Determine if using default or custom prompt by checking if prompt matches default
-            # Note: This is a best-effort check. If user saved the exact default text, it will show as custom.
-            is_likely_default = prompt.strip() == default_ocr_prompt.strip()
-            if is_likely_default:
-                prompt_source = f"DEFAULT (fallback - {prompt_key} was empty in database)"
-            else:
-                prompt_source = f"CUSTOM (from database settings - {prompt_source_detail})"
+            model = settings_service.get_llm_model("ocr_model", default="gpt-4o", llm_settings=llm_settings)
             
-            # Log prompt details for debugging
-            logger.info("=" * 80)
-            logger.info("OCR LLM REQUEST:")
-            logger.info("=" * 80)
-            logger.info(f"Prompt key used: {prompt_key}")
-            logger.info(f"Prompt source: {prompt_source}")
-            logger.info(f"Using model: {model}")
-            logger.info(f"Document type: {doc_type}")
-            logger.info(f"File name: {file_name}")
-            logger.info(f"Prompt (length: {len(prompt)} characters):")
-            logger.info("-" * 80)
-            logger.info(prompt)
-            logger.info("-" * 80)
-            logger.info("=" * 80)
+            logger.debug(
+                "OCR request model=%s prompt_key=%s doc_type=%s prompt_len=%d",
+                model, prompt_key, doc_type, len(prompt)
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                # Best-effort check: if the user saved the exact default text it shows as default
+                is_likely_default = prompt.strip() == default_ocr_prompt.strip()
+                logger.debug(
+                    "OCR prompt source: %s\n%s",
+                    "DEFAULT" if is_likely_default else f"CUSTOM ({prompt_source_detail})",
+                    prompt
+                )
             
-            # Convert image bytes to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            mime_type = "image/png" if file_name.endswith('.png') else "image/jpeg"
+            # Convert image bytes to base64 unless the caller already did
+            if data_url is None:
+                data_url = self.build_data_url(image_bytes, file_name)
             
             # Call OpenAI Vision API
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=4000,
-                temperature=0
+            # Stream the response so tokens are consumed as they are generated
+            stream = await self.client.chat.completions.create(
+                **self._vision_request(self._ocr_template, model, prompt, data_url),
+                stream=True,
+                stream_options={"include_usage": True}
             )
+            parts = []
+            usage = None
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = chunk.usage
             
             # Parse JSON response
-            import json
-            result_text = response.choices[0].message.content.strip()
+            result_text = "".join(parts)
             
-            # Log response details
-            logger.info("=" * 80)
-            logger.info("OCR LLM RESPONSE:")
-            logger.info("=" * 80)
-            logger.info(f"Raw response length: {len(result_text)} characters")
-            logger.info(f"Model: {model}")
-            logger.info(f"Tokens used: {response.usage.total_tokens if hasattr(response, 'usage') and response.usage else 'N/A'}")
-            logger.info("Response preview (first 500 chars):")
-            logger.info("-" * 80)
-            logger.info(result_text[:500] + ("..." if len(result_text) > 500 else ""))
-            logger.info("-" * 80)
-            logger.info("=" * 80)
+            logger.debug(
+                "OCR response model=%s response_len=%d tokens=%s",
+                model, len(result_text), usage.total_tokens if usage else "N/A"
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("OCR response preview: %s", result_text[:500])
             
-            ocr_data = json.loads(result_text)
-            return ocr_data
+            ocr_data = orjson.loads(result_text)
+            return ocr_data, True
             
         except Exception as e:
-            logger.error(f"OCR extraction failed: {str(e)}", exc_info=True)
-            return {"error": str(e), "raw_text": ""}
+            logger.error("OCR extraction failed: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return {"error": str(e), "raw_text": ""}, False
 
 
 # Singleton instance
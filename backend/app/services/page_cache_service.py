@@ -0,0 +1,139 @@
+"""Service for caching page classification/OCR results by page content hash"""
+from typing import Optional, Dict, Any, List, Tuple
+from cachetools import LRUCache
+from app.services.database import get_supabase_admin_client
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# In-process (L1) cache size, in pages
+_L1_CACHE_SIZE = 1024
+
+# (classification, OCR payload or None)
+PageResult = Tuple[str, Optional[Dict[str, Any]]]
+
+
+def page_content_hash(page_bytes: bytes) -> str:
+    """SHA-256 hex digest of a rendered page image"""
+    return hashlib.sha256(page_bytes).hexdigest()
+
+
+class PageCacheService:
+    """
+    Cache of classification + OCR results keyed by (page content hash, prompt version).
+
+    Results are kept in a small in-process LRU in front of the `doc_page_cache`
+    table, so re-uploaded pages skip both OpenAI calls. Cache failures are
+    logged and treated as misses; they never fail a job.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._disabled = False
+        # (content_sha256, prompt_version) -> result
+        self._l1: LRUCache = LRUCache(maxsize=_L1_CACHE_SIZE)
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        Lazy-load the service role client on first use.
+
+        The cache table holds OCR output across users, so it is only reachable
+        with the service role key (RLS enabled, no policies).
+        """
+        if self._client is None:
+            self._client = get_supabase_admin_client()
+        return self._client
+
+    def _l1_get(self, key: Tuple[str, str]) -> Optional[PageResult]:
+        with self._lock:
+            return self._l1.get(key)
+
+    def _l1_put(self, key: Tuple[str, str], result: PageResult):
+        with self._lock:
+            self._l1[key] = result
+
+    def get_many(self, content_hashes: List[str], prompt_version: str) -> Dict[str, PageResult]:
+        """
+        Look up cached results for several pages, with at most one database query.
+
+        Args:
+            content_hashes: Page content hashes
+            prompt_version: Fingerprint of the prompts/models that produced the results
+
+        Returns:
+            Dictionary mapping content hash to (classification, ocr_payload) for cache hits
+        """
+        hits = {}
+        missing = []
+        for content_hash in dict.fromkeys(content_hashes):
+            result = self._l1_get((content_hash, prompt_version))
+            if result is not None:
+                hits[content_hash] = result
+            else:
+                missing.append(content_hash)
+
+        if not missing or self._disabled:
+            return hits
+
+        try:
+            response = (
+                self.client.table("doc_page_cache")
+                .select("content_sha256, classification, ocr_payload")
+                .eq("prompt_version", prompt_version)
+                .in_("content_sha256", missing)
+                .execute()
+            )
+            for row in response.data or []:
+                result = (row["classification"], row["ocr_payload"])
+                hits[row["content_sha256"]] = result
+                self._l1_put((row["content_sha256"], prompt_version), result)
+        except ValueError as e:
+            # No service role key configured; run without the shared cache
+            self._disabled = True
+            logger.warning("Page cache disabled: %s", e)
+        except Exception as e:
+            logger.warning("Failed to read page cache: %s", e)
+
+        return hits
+
+    def put_many(self, results: Dict[str, PageResult], prompt_version: str):
+        """
+        Store results for several pages with a single upsert.
+
+        Args:
+            results: Dictionary mapping content hash to (classification, ocr_payload)
+            prompt_version: Fingerprint of the prompts/models that produced the results
+        """
+        if not results:
+            return
+
+        for content_hash, result in results.items():
+            self._l1_put((content_hash, prompt_version), result)
+
+        if self._disabled:
+            return
+
+        rows = [
+            {
+                "content_sha256": content_hash,
+                "prompt_version": prompt_version,
+                "classification": classification,
+                "ocr_payload": ocr_payload,
+            }
+            for content_hash, (classification, ocr_payload) in results.items()
+        ]
+        try:
+            self.client.table("doc_page_cache").upsert(rows).execute()
+        except ValueError as e:
+            self._disabled = True
+            logger.warning("Page cache disabled: %s", e)
+        except Exception as e:
+            logger.warning("Failed to write page cache: %s", e)
+
+
+# Singleton instance
+page_cache_service = PageCacheService()
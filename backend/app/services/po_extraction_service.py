@@ -2,9 +2,21 @@
 from typing import Optional, Dict, Any
 import re
 import logging
+import ahocorasick
 
 logger = logging.getLogger(__name__)
 
+# Value following a PO keyword, e.g. "PO Number: VALUE" or "PO Number VALUE"
+_PO_VALUE_RE = re.compile(r"\s*[:#\-]?\s*([A-Z0-9\-/]+)", re.IGNORECASE)
+
+# Common PO number formats (alphanumeric with dashes/slashes), in priority order
+_PO_FORMAT_PATTERNS = [
+    re.compile(r'\b([A-Z]{2,4}[\-]?[A-Z0-9]{3,}[\-]?[0-9]+)\b', re.IGNORECASE),  # PO-1234, PO1234
+    re.compile(r'\b([A-Z]{2,4}[\-][0-9]{4,})\b', re.IGNORECASE),  # PO-12345
+    re.compile(r'\b(ORD[\-]?[A-Z0-9]+)\b', re.IGNORECASE),  # ORD-1234
+    re.compile(r'\b(PO[\#]?[\s]?[0-9]{3,})\b', re.IGNORECASE),  # PO#1234, PO 1234
+]
+
 
 class POExtractionService:
     """Service for extracting PO number from OCR payload"""
@@ -25,6 +37,13 @@ class POExtractionService:
             "order#",
         ]
 
+        # Aho-Corasick automaton over all keywords so text search is a single pass;
+        # each keyword carries its priority (index in po_keywords) and length
+        self._po_automaton = ahocorasick.Automaton()
+        for priority, keyword in enumerate(self.po_keywords):
+            self._po_automaton.add_word(keyword, (priority, len(keyword)))
+        self._po_automaton.make_automaton()
+
     def extract_po_number(self, ocr_payload: Dict[str, Any]) -> Optional[str]:
         """
         Extract PO number from OCR payload using fuzzy matching.
@@ -140,32 +159,27 @@ class POExtractionService:
 
         text_lower = text.lower()
 
-        # Look for PO keywords followed by a value
-        for keyword in self.po_keywords:
-            # Pattern 1: "PO Number: VALUE" or "PO Number VALUE"
-            patterns = [
-                rf"{re.escape(keyword)}\s*[:#\-]?\s*([A-Z0-9\-/]+)",
-                rf"{re.escape(keyword)}\s+([A-Z0-9\-/]+)",
-            ]
-
-            for pattern in patterns:
-                matches = re.finditer(pattern, text_lower, re.IGNORECASE)
-                for match in matches:
-                    po_value = match.group(1).strip()
-                    if self._is_valid_po(po_value):
-                        return po_value
-
-        # Pattern 2: Common PO number formats (alphanumeric with dashes/slashes)
-        po_patterns = [
-            r'\b([A-Z]{2,4}[\-]?[A-Z0-9]{3,}[\-]?[0-9]+)\b',  # PO-1234, PO1234
-            r'\b([A-Z]{2,4}[\-][0-9]{4,})\b',  # PO-12345
-            r'\b(ORD[\-]?[A-Z0-9]+)\b',  # ORD-1234
-            r'\b(PO[\#]?[\s]?[0-9]{3,})\b',  # PO#1234, PO 1234
-        ]
+        # Look for PO keywords followed by a value, trying keywords in po_keywords
+        # priority order and, for each keyword, in text order. Where several keywords
+        # start at the same position (e.g. "purchase order" / "purchase order number"),
+        # the longest is used so the value isn't mistaken for "number"; the hit keeps
+        # the best priority of the keywords starting there.
+        keyword_hits = {}  # start_idx -> (priority, keyword_len)
+        for end_idx, (priority, keyword_len) in self._po_automaton.iter(text_lower):
+            start_idx = end_idx - keyword_len + 1
+            best_priority, best_len = keyword_hits.get(start_idx, (priority, 0))
+            keyword_hits[start_idx] = (min(priority, best_priority), max(keyword_len, best_len))
+
+        for start_idx, (_, keyword_len) in sorted(keyword_hits.items(), key=lambda hit: (hit[1][0], hit[0])):
+            match = _PO_VALUE_RE.match(text_lower, start_idx + keyword_len)
+            if match:
+                po_value = match.group(1).strip()
+                if self._is_valid_po(po_value):
+                    return po_value
 
-        for pattern in po_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        # Pattern 2: Common PO number formats
+        for pattern in _PO_FORMAT_PATTERNS:
+            for match in pattern.finditer(text):
                 po_value = match.group(1).strip()
                 if self._is_valid_po(po_value):
                     return po_value
@@ -1,58 +1,173 @@
 """Service for Redis operations (draft session state)"""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
+import asyncio
 import json
+import socket
+from urllib.parse import urlparse
+import msgspec
 import redis
+import redis.asyncio as aioredis
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redis client singleton
-_redis_client: Optional[redis.Redis] = None
+# Draft sessions are stored as a HASH with one MessagePack-encoded value per field
+_session_encoder = msgspec.msgpack.Encoder()
+_field_decoder = msgspec.msgpack.Decoder()
+# Legacy sessions were stored as a single MessagePack (or JSON) blob
+_session_decoder = msgspec.msgpack.Decoder(dict)
 
 
-def get_redis_client() -> redis.Redis:
-    """Get or create Redis client"""
+def _encode_fields(data: Dict[str, Any]) -> Dict[str, bytes]:
+    """Encode session fields for HSET"""
+    return {field: _session_encoder.encode(value) for field, value in data.items()}
+
+
+def _decode_fields(raw: Union[Dict[bytes, bytes], List[bytes]]) -> Dict[str, Any]:
+    """Decode an HGETALL reply (a dict, or a flat field/value list when returned from Lua)"""
+    if isinstance(raw, list):
+        raw = dict(zip(raw[::2], raw[1::2]))
+    return {field.decode(): _field_decoder.decode(value) for field, value in raw.items()}
+
+
+def _decode_session(raw: bytes) -> Dict[str, Any]:
+    """Decode a legacy single-blob draft session"""
+    # Sessions written before the MessagePack switch are JSON objects
+    if raw[:1] == b"{":
+        return json.loads(raw)
+    return _session_decoder.decode(raw)
+
+
+def _is_wrong_type(error: Exception) -> bool:
+    """Whether a Redis error means the key holds a legacy string session rather than a HASH"""
+    return isinstance(error, redis.ResponseError) and str(error).startswith("WRONGTYPE")
+
+
+# Redis client singletons
+_redis_client: Optional[aioredis.Redis] = None
+_sync_redis_client: Optional[redis.Redis] = None
+
+# Connection pool sizing; callers wait for a free connection instead of failing
+REDIS_MAX_CONNECTIONS = 32
+REDIS_HEALTH_CHECK_INTERVAL = 30
+# Connect/read timeouts (seconds) so an unresponsive Redis fails fast and callers fall back
+REDIS_SOCKET_CONNECT_TIMEOUT = 5
+REDIS_SOCKET_TIMEOUT = 5
+
+# REDIS_URL is parsed once; Upstash (rediss://) URLs need an explicit SSL pool
+_REDIS_URL = settings.REDIS_URL
+_REDIS_PARSED = urlparse(_REDIS_URL) if _REDIS_URL.startswith('rediss://') else None
+
+
+def _keepalive_options() -> Dict[int, int]:
+    """TCP keepalive tuning so idle pooled connections aren't dropped (Linux option names)"""
+    options = {}
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+        if hasattr(socket, name):
+            options[getattr(socket, name)] = value
+    return options
+
+
+def _create_pool(redis_module):
+    """
+    Create a BlockingConnectionPool for REDIS_URL.
+    
+    Args:
+        redis_module: `redis` for a blocking pool or `redis.asyncio` for an async one
+    """
+    pool_kwargs = {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "socket_keepalive": True,
+        "socket_keepalive_options": _keepalive_options(),
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        # Replies stay raw bytes: sessions are MessagePack, and the few text values
+        # (e.g. the settings version counter) are parsed directly from bytes
+        "decode_responses": False,
+    }
+    
+    # For Upstash (rediss://), we need to handle SSL properly
+    if _REDIS_PARSED is not None:
+        return redis_module.BlockingConnectionPool(
+            connection_class=redis_module.SSLConnection,
+            host=_REDIS_PARSED.hostname,
+            port=_REDIS_PARSED.port or 6380,
+            password=_REDIS_PARSED.password,
+            ssl_cert_reqs=None,  # Disable SSL certificate verification for Upstash
+            **pool_kwargs
+        )
+    
+    # Standard redis:// URL (local or non-SSL)
+    return redis_module.BlockingConnectionPool.from_url(_REDIS_URL, **pool_kwargs)
+
+
+def get_redis_client() -> aioredis.Redis:
+    """
+    Get or create async Redis client.
+    
+    Creating the client does not open a connection, so this is safe to call
+    at import/startup time; the connection test runs on first use.
+    """
     global _redis_client
     
     if _redis_client is None:
         try:
-            redis_url = settings.REDIS_URL
-            
-            # For Upstash (rediss://), we need to handle SSL properly
-            if redis_url.startswith('rediss://'):
-                # Parse URL and create client with SSL configuration
-                from urllib.parse import urlparse
-                parsed = urlparse(redis_url)
-                
-                _redis_client = redis.Redis(
-                    host=parsed.hostname,
-                    port=parsed.port or 6380,
-                    password=parsed.password,
-                    ssl=True,
-                    ssl_cert_reqs=None,  # Disable SSL certificate verification for Upstash
-                    decode_responses=True
-                )
-            else:
-                # Standard redis:// URL (local or non-SSL)
-                _redis_client = redis.from_url(redis_url, decode_responses=True)
-            
-            # Test connection
-            _redis_client.ping()
+            _redis_client = aioredis.Redis(connection_pool=_create_pool(aioredis))
             logger.info("Redis client initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize Redis client: {str(e)}")
+            logger.error("Failed to initialize Redis client: %s", e)
             raise
     
     return _redis_client
 
 
+def get_sync_redis_client() -> redis.Redis:
+    """Get or create blocking Redis client for sync code paths (services used by workers)"""
+    global _sync_redis_client
+    
+    if _sync_redis_client is None:
+        try:
+            _sync_redis_client = redis.Redis(connection_pool=_create_pool(redis))
+            logger.info("Sync Redis client initialized successfully")
+        except Exception as e:
+            logger.error("Failed to initialize sync Redis client: %s", e)
+            raise
+    
+    return _sync_redis_client
+
+
+# Extend TTL and read the session in a single round-trip (legacy string sessions are returned as-is)
+_TOUCH_SESSION_LUA = """
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if redis.call('TYPE', KEYS[1]).ok == 'hash' then
+    return redis.call('HGETALL', KEYS[1])
+end
+return redis.call('GET', KEYS[1])
+"""
+
+# Update fields of an existing HASH session and extend its TTL; returns 0 if there is no such session
+_UPDATE_SESSION_LUA = """
+if redis.call('TYPE', KEYS[1]).ok ~= 'hash' then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
 class RedisService:
     """Service for managing draft session state in Redis"""
 
     def __init__(self):
         # Lazy initialization - don't fail on module import
         self._client = None
+        self._touch_script = None
+        self._update_script = None
+        self._connected = False
+        self._connect_lock: Optional[asyncio.Lock] = None
         self.session_ttl = 3600  # 1 hour TTL for draft sessions
     
     @property
@@ -62,7 +177,41 @@ class RedisService:
             self._client = get_redis_client()
         return self._client
 
-    def set_draft_session(self, session_key: str, data: Dict[str, Any]) -> bool:
+    @property
+    def touch_script(self):
+        """Lazy-register the EXPIRE + GET Lua script on first use"""
+        if self._touch_script is None:
+            self._touch_script = self.client.register_script(_TOUCH_SESSION_LUA)
+        return self._touch_script
+
+    @property
+    def update_script(self):
+        """Lazy-register the HSET + EXPIRE Lua script on first use"""
+        if self._update_script is None:
+            self._update_script = self.client.register_script(_UPDATE_SESSION_LUA)
+        return self._update_script
+
+    async def _ensure_connected(self) -> None:
+        """Test the Redis connection once, on first use"""
+        if self._connected:
+            return
+        # Created lazily so the lock binds to the running event loop
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if not self._connected:
+                await self.client.ping()
+                self._connected = True
+                logger.info("Redis connection verified")
+
+    def _queue_set(self, pipe, session_key: str, data: Dict[str, Any]) -> None:
+        """Queue commands replacing a whole session (and any legacy blob) on a pipeline"""
+        pipe.delete(session_key)
+        if data:
+            pipe.hset(session_key, mapping=_encode_fields(data))
+            pipe.expire(session_key, self.session_ttl)
+
+    async def set_draft_session(self, session_key: str, data: Dict[str, Any]) -> bool:
         """
         Store draft session data in Redis.
         
@@ -74,15 +223,17 @@ class RedisService:
             True if successful
         """
         try:
-            json_data = json.dumps(data)
-            self.client.setex(session_key, self.session_ttl, json_data)
-            logger.info(f"Stored draft session: {session_key}")
+            await self._ensure_connected()
+            async with self.client.pipeline(transaction=True) as pipe:
+                self._queue_set(pipe, session_key, data)
+                await pipe.execute()
+            logger.info("Stored draft session: %s", session_key)
             return True
         except Exception as e:
-            logger.error(f"Failed to store draft session: {str(e)}")
+            logger.error("Failed to store draft session: %s", e)
             raise
 
-    def get_draft_session(self, session_key: str) -> Optional[Dict[str, Any]]:
+    async def get_draft_session(self, session_key: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve draft session data from Redis.
         
@@ -93,15 +244,74 @@ class RedisService:
             Dictionary containing session data, or None if not found
         """
         try:
-            json_data = self.client.get(session_key)
-            if json_data:
-                return json.loads(json_data)
+            await self._ensure_connected()
+            try:
+                raw = await self.client.hgetall(session_key)
+                return _decode_fields(raw) if raw else None
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                raw = await self.client.get(session_key)
+                return _decode_session(raw) if raw else None
+        except Exception as e:
+            logger.error("Failed to retrieve draft session: %s", e)
+            return None
+
+    async def get_draft_session_field(self, session_key: str, field: str) -> Optional[Any]:
+        """
+        Retrieve a single field of a draft session.
+        
+        Args:
+            session_key: Unique session key
+            field: Session field name
+            
+        Returns:
+            Field value, or None if the session or field is not found
+        """
+        try:
+            await self._ensure_connected()
+            raw = await self.client.hget(session_key, field)
+            return _field_decoder.decode(raw) if raw else None
+        except redis.ResponseError as e:
+            if _is_wrong_type(e):
+                session = await self.get_draft_session(session_key)
+                return session.get(field) if session else None
+            logger.error("Failed to retrieve draft session field: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Failed to retrieve draft session: {str(e)}")
+            logger.error("Failed to retrieve draft session field: %s", e)
             return None
 
-    def delete_draft_session(self, session_key: str) -> bool:
+    async def set_draft_session_fields(self, session_key: str, fields: Dict[str, Any]) -> bool:
+        """
+        Update some fields of an existing draft session and extend its TTL.
+        
+        Only the given fields are sent, instead of rewriting the whole session.
+        
+        Args:
+            session_key: Unique session key
+            fields: Dictionary of fields to update
+            
+        Returns:
+            True if updated, False if the session does not exist (or is a legacy
+            single-blob session), in which case callers should use set_draft_session
+        """
+        if not fields:
+            return True
+        try:
+            await self._ensure_connected()
+            args = [self.session_ttl]
+            for field, value in _encode_fields(fields).items():
+                args.extend((field, value))
+            updated = await self.update_script(keys=[session_key], args=args)
+            if updated:
+                logger.info("Updated draft session fields: %s %s", session_key, list(fields))
+            return bool(updated)
+        except Exception as e:
+            logger.error("Failed to update draft session fields: %s", e)
+            raise
+
+    async def delete_draft_session(self, session_key: str) -> bool:
         """
         Delete draft session data from Redis.
         
@@ -112,21 +322,108 @@ class RedisService:
             True if successful
         """
         try:
-            self.client.delete(session_key)
-            logger.info(f"Deleted draft session: {session_key}")
+            await self._ensure_connected()
+            await self.client.delete(session_key)
+            logger.info("Deleted draft session: %s", session_key)
             return True
         except Exception as e:
-            logger.error(f"Failed to delete draft session: {str(e)}")
+            logger.error("Failed to delete draft session: %s", e)
             return False
 
-    def extend_session_ttl(self, session_key: str) -> bool:
+    async def extend_session_ttl(self, session_key: str) -> bool:
         """Extend session TTL"""
         try:
-            return self.client.expire(session_key, self.session_ttl)
+            await self._ensure_connected()
+            return await self.client.expire(session_key, self.session_ttl)
         except Exception as e:
-            logger.error(f"Failed to extend session TTL: {str(e)}")
+            logger.error("Failed to extend session TTL: %s", e)
             return False
 
+    async def touch_draft_session(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Extend session TTL and retrieve session data in one round-trip.
+        
+        Args:
+            session_key: Unique session key
+            
+        Returns:
+            Dictionary containing session data, or None if not found
+        """
+        try:
+            await self._ensure_connected()
+            raw = await self.touch_script(keys=[session_key], args=[self.session_ttl])
+            if not raw:
+                return None
+            if isinstance(raw, list):
+                return _decode_fields(raw)
+            return _decode_session(raw)
+        except Exception as e:
+            logger.error("Failed to touch draft session: %s", e)
+            return None
+
+    async def get_draft_sessions_bulk(self, session_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve multiple draft sessions in a single pipelined round-trip.
+        
+        Args:
+            session_keys: List of session keys
+            
+        Returns:
+            Dictionary mapping session key to session data (missing keys are omitted)
+        """
+        if not session_keys:
+            return {}
+        try:
+            await self._ensure_connected()
+            async with self.client.pipeline(transaction=False) as pipe:
+                for session_key in session_keys:
+                    pipe.hgetall(session_key)
+                values = await pipe.execute(raise_on_error=False)
+            
+            sessions = {}
+            legacy_keys = []
+            for key, value in zip(session_keys, values):
+                if isinstance(value, Exception):
+                    if not _is_wrong_type(value):
+                        raise value
+                    legacy_keys.append(key)
+                elif value:
+                    sessions[key] = _decode_fields(value)
+            
+            # Legacy single-blob sessions are read with one MGET
+            if legacy_keys:
+                for key, value in zip(legacy_keys, await self.client.mget(legacy_keys)):
+                    if value:
+                        sessions[key] = _decode_session(value)
+            return sessions
+        except Exception as e:
+            logger.error("Failed to retrieve draft sessions: %s", e)
+            return {}
+
+    async def set_draft_sessions_bulk(self, items: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Store multiple draft sessions in a single pipelined round-trip.
+        
+        Args:
+            items: Dictionary mapping session key to session data
+            
+        Returns:
+            True if successful
+        """
+        if not items:
+            return True
+        try:
+            await self._ensure_connected()
+            async with self.client.pipeline(transaction=True) as pipe:
+                for session_key, data in items.items():
+                    self._queue_set(pipe, session_key, data)
+                await pipe.execute()
+            logger.info("Stored %d draft sessions", len(items))
+            return True
+        except Exception as e:
+            logger.error("Failed to store draft sessions: %s", e)
+            raise
+
 
 # Singleton instance - lazy initialization to avoid startup errors
 redis_service = RedisService()
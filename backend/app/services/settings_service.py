@@ -1,10 +1,23 @@
 """Service for fetching configuration from settings table"""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from cachetools import TTLCache
 from app.services.database import get_supabase_client
+from app.services.redis_service import get_sync_redis_client
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Redis key bumped on every settings write; cache entries from older versions are stale
+SETTINGS_VERSION_KEY = "settings:version"
+# How long a version read from Redis is trusted before checking again (seconds)
+SETTINGS_VERSION_CHECK_INTERVAL = 1.0
+# How long a fetched settings category is reused even if the version is unchanged (seconds)
+SETTINGS_CATEGORY_TTL = 60
+# Upper bound on cached settings categories
+SETTINGS_CACHE_MAXSIZE = 256
+
 # Cache for settings (to avoid repeated DB queries)
 _settings_cache: Optional[Dict[str, Any]] = None
 
@@ -14,10 +27,76 @@ class SettingsService:
     
     def __init__(self):
         self.client = get_supabase_client()
-        self._cache = {}
+        # category -> (settings version seen when fetched, {key: value}); entries expire after the TTL
+        self._category_cache: TTLCache = TTLCache(maxsize=SETTINGS_CACHE_MAXSIZE, ttl=SETTINGS_CATEGORY_TTL)
+        # TTLCache lookups can evict expired entries, so guard it across threads
+        self._cache_lock = threading.Lock()
+        # Single-flight state: one in-progress fetch per category, others wait on it
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_result: Dict[str, Dict[str, str]] = {}
+        self._inflight_lock = threading.Lock()
+        self._version = 0
+        self._version_checked_at = float("-inf")
+    
+    def _current_version(self) -> int:
+        """Get the shared settings version, re-reading it from Redis at most once per interval"""
+        now = time.monotonic()
+        if now - self._version_checked_at >= SETTINGS_VERSION_CHECK_INTERVAL:
+            try:
+                self._version = int(get_sync_redis_client().get(SETTINGS_VERSION_KEY) or 0)
+            except Exception as e:
+                # Keep serving the local cache; it is still cleared by clear_cache()
+                logger.warning("Failed to read settings version: %s", e)
+            self._version_checked_at = now
+        return self._version
+    
+    def _get_fresh(self, category: str) -> Optional[Dict[str, str]]:
+        """Get a cached category if it is within its TTL and from the current settings version"""
+        with self._cache_lock:
+            entry: Optional[Tuple[int, Dict[str, str]]] = self._category_cache.get(category)
+        if entry is not None and entry[0] == self._current_version():
+            return entry[1]
+        return None
+    
+    def _get_category(self, category: str) -> Dict[str, str]:
+        """Get all settings for a category, fetching the whole category once per TTL"""
+        settings = self._get_fresh(category)
+        if settings is None:
+            version = self._current_version()
+            settings = self._fetch_settings(category)
+            with self._cache_lock:
+                self._category_cache[category] = (version, settings)
+        return settings
     
     def _fetch_settings(self, category: str) -> Dict[str, str]:
-        """Fetch settings for a category from database"""
+        """
+        Fetch settings for a category from database.
+        
+        Concurrent callers for the same category share a single query: the
+        first caller runs it and the rest wait for its result.
+        """
+        with self._inflight_lock:
+            event = self._inflight.get(category)
+            is_leader = event is None
+            if is_leader:
+                event = threading.Event()
+                self._inflight[category] = event
+        
+        if not is_leader:
+            event.wait()
+            return self._inflight_result.get(category, {})
+        
+        try:
+            settings = self._query_settings(category)
+            self._inflight_result[category] = settings
+            return settings
+        finally:
+            with self._inflight_lock:
+                del self._inflight[category]
+            event.set()
+    
+    def _query_settings(self, category: str) -> Dict[str, str]:
+        """Query settings for a category from database"""
         try:
             result = self.client.table("settings").select("*").eq("category", category).execute()
             
@@ -28,16 +107,22 @@ class SettingsService:
             
             return settings
         except Exception as e:
-            logger.error(f"Failed to fetch settings for category {category}: {str(e)}")
+            logger.error("Failed to fetch settings for category %s: %s", category, e)
             return {}
     
-    def get_llm_prompt(self, prompt_type: str, default: Optional[str] = None) -> str:
+    def get_llm_prompt(
+        self,
+        prompt_type: str,
+        default: Optional[str] = None,
+        llm_settings: Optional[Dict[str, str]] = None
+    ) -> str:
         """
         Get LLM prompt from settings table.
         
         Args:
             prompt_type: Type of prompt (classification_prompt, ocr_prompt, fuzzy_match_prompt)
             default: Default prompt if not found in database (None means raise error if not found)
+            llm_settings: 'llm' category snapshot to read from instead of the cache
         
         Returns:
             Prompt string
@@ -45,58 +130,73 @@ class SettingsService:
         Raises:
             ValueError: If prompt is not found and no default is provided
         """
-        cache_key = f"llm_prompts_{prompt_type}"
+        if llm_settings is None:
+            llm_settings = self._get_category("llm")
+        prompt_value = llm_settings.get(prompt_type, None)
         
-        if cache_key not in self._cache:
-            logger.debug(f"Prompt '{prompt_type}' not in cache, fetching from database...")
-            settings = self._fetch_settings("llm")
-            prompt_value = settings.get(prompt_type, None)
-            
-            logger.debug(f"Database value for '{prompt_type}': {'empty/None' if not prompt_value or not prompt_value.strip() else f'found ({len(prompt_value.strip())} chars)'}")
-            
-            # Check if value is empty/None and use default if so
-            if not prompt_value or (isinstance(prompt_value, str) and not prompt_value.strip()):
-                if default is not None:
-                    logger.warning(f"Prompt '{prompt_type}' is empty in database, using DEFAULT prompt")
-                    self._cache[cache_key] = default
-                else:
-                    error_msg = f"Prompt '{prompt_type}' is empty in database and no default provided"
-                    logger.error(error_msg)
-                    raise ValueError(error_msg)
-            else:
-                logger.info(f"Prompt '{prompt_type}' loaded from database (CUSTOM prompt, length: {len(prompt_value.strip())} chars)")
-                # Show first 100 chars as preview
-                preview = prompt_value.strip()[:100] + ("..." if len(prompt_value.strip()) > 100 else "")
-                logger.debug(f"Prompt preview: {preview}")
-                self._cache[cache_key] = prompt_value.strip()
-        else:
-            logger.debug(f"Prompt '{prompt_type}' found in cache (length: {len(self._cache[cache_key])} chars)")
+        # Check if value is empty/None and use default if so
+        if not prompt_value or (isinstance(prompt_value, str) and not prompt_value.strip()):
+            if default is not None:
+                logger.debug("Prompt '%s' is empty in database, using DEFAULT prompt", prompt_type)
+                return default
+            error_msg = f"Prompt '{prompt_type}' is empty in database and no default provided"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
         
-        return self._cache[cache_key]
+        return prompt_value.strip()
     
-    def get_llm_model(self, model_type: str, default: str = "gpt-4o") -> str:
+    def get_llm_model(
+        self,
+        model_type: str,
+        default: str = "gpt-4o",
+        llm_settings: Optional[Dict[str, str]] = None
+    ) -> str:
         """
         Get LLM model name from settings table.
         
         Args:
             model_type: Type of model (classification_model, ocr_model, fuzzy_match_model)
             default: Default model if not found
+            llm_settings: 'llm' category snapshot to read from instead of the cache
         
         Returns:
             Model name string
         """
-        cache_key = f"llm_models_{model_type}"
+        if llm_settings is None:
+            llm_settings = self._get_category("llm")
+        return llm_settings.get(model_type, default)
+    
+    def get_category_settings(self, category: str) -> Dict[str, str]:
+        """
+        Get all settings for a category.
         
-        if cache_key not in self._cache:
-            settings = self._fetch_settings("llm")
-            self._cache[cache_key] = settings.get(model_type, default)
+        Args:
+            category: Settings category (e.g. 'llm')
         
-        return self._cache[cache_key]
+        Returns:
+            Copy of the category's {key: value} settings
+        """
+        return dict(self._get_category(category))
     
     def clear_cache(self):
         """Clear settings cache (useful after settings update)"""
-        self._cache.clear()
+        with self._cache_lock:
+            self._category_cache.clear()
         logger.info("Settings cache cleared")
+    
+    def invalidate(self):
+        """
+        Invalidate cached settings in every process after a settings write.
+        
+        Bumps the shared version in Redis so other API/worker processes drop
+        their cached values on their next lookup, and clears the local cache.
+        """
+        try:
+            self._version = int(get_sync_redis_client().incr(SETTINGS_VERSION_KEY))
+            self._version_checked_at = time.monotonic()
+        except Exception as e:
+            logger.warning("Failed to bump settings version: %s", e)
+        self.clear_cache()
 
 
 # Singleton instance
@@ -1,12 +1,26 @@
-from typing import Optional
+from typing import Optional, List
+from cachetools import TLRUCache
 from supabase import create_client, Client
 from app.core.config import settings
 import logging
-import uuid
-from datetime import datetime
+import secrets
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Content types by lowercase file extension
+_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+}
+
+# Signed URL cache: max entries, and how long before expiry a cached URL stops being handed out
+_URL_CACHE_SIZE = 1024
+_URL_EXPIRY_MARGIN = 60
+
 # Storage client with service role key (bypasses RLS)
 _storage_client: Optional[Client] = None
 
@@ -25,7 +39,7 @@ def get_storage_client() -> Client:
             )
             logger.info("Storage client initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize storage client: {str(e)}")
+            logger.error("Failed to initialize storage client: %s", e)
             raise
     
     return _storage_client
@@ -38,17 +52,20 @@ class StorageService:
         # Use separate client with service role key for storage operations
         self.client = get_storage_client()
         self.bucket = settings.SUPABASE_STORAGE_BUCKET
+        # Bucket handle resolved once; it only wraps the client's shared HTTP session
+        self._bucket_client = self.client.storage.from_(self.bucket)
+        # (storage_path, expires_in) -> signed_url; each entry expires _URL_EXPIRY_MARGIN before its URL does
+        self._url_cache: TLRUCache = TLRUCache(
+            maxsize=_URL_CACHE_SIZE,
+            ttu=lambda key, signed_url, now: now + key[1] - _URL_EXPIRY_MARGIN
+        )
+        self._url_cache_lock = threading.Lock()
     
-    def _get_content_type(self, file_name: str) -> str:
+    @staticmethod
+    def _get_content_type(file_name: str) -> str:
         """Determine content type from file extension"""
-        file_ext = file_name.lower().split('.')[-1] if '.' in file_name else ''
-        content_types = {
-            'pdf': 'application/pdf',
-            'png': 'image/png',
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-        }
-        return content_types.get(file_ext, 'application/octet-stream')
+        _, dot, file_ext = file_name.rpartition('.')
+        return _CONTENT_TYPES.get(file_ext.lower() if dot else '', 'application/octet-stream')
     
     def upload_file(
         self,
@@ -71,8 +88,8 @@ class StorageService:
         """
         try:
             # Generate unique file path
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
+            timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+            unique_id = secrets.token_hex(4)
             
             if folder:
                 storage_path = f"{folder}/{job_id}_{timestamp}_{unique_id}_{file_name}"
@@ -81,23 +98,23 @@ class StorageService:
             
             # Determine content type from file extension
             content_type = self._get_content_type(file_name)
-            logger.info(f"Uploading file {file_name} with content-type: {content_type}")
+            logger.info("Uploading file %s with content-type: %s", file_name, content_type)
             
             # Upload to Supabase Storage
-            response = self.client.storage.from_(self.bucket).upload(
+            response = self._bucket_client.upload(
                 path=storage_path,
                 file=file_content,
                 file_options={"content-type": content_type}
             )
             
             if response:
-                logger.info(f"File uploaded successfully: {storage_path}")
+                logger.info("File uploaded successfully: %s", storage_path)
                 return storage_path
             else:
                 raise Exception("Upload response was empty")
                 
         except Exception as e:
-            logger.error(f"Failed to upload file: {str(e)}")
+            logger.error("Failed to upload file: %s", e)
             raise
     
     def get_file_url(self, storage_path: str, expires_in: int = 3600) -> str:
@@ -111,15 +128,33 @@ class StorageService:
         Returns:
             Signed URL for file access
         """
+        cache_key = (storage_path, expires_in)
+        with self._url_cache_lock:
+            cached = self._url_cache.get(cache_key)
+        if cached:
+            return cached
+        
         try:
-            response = self.client.storage.from_(self.bucket).create_signed_url(
+            response = self._bucket_client.create_signed_url(
                 path=storage_path,
                 expires_in=expires_in
             )
-            return response.get("signedURL", "")
+            signed_url = response.get("signedURL", "")
         except Exception as e:
-            logger.error(f"Failed to get file URL: {str(e)}")
+            logger.error("Failed to get file URL: %s", e)
             raise
+        
+        if signed_url:
+            with self._url_cache_lock:
+                self._url_cache[cache_key] = signed_url
+        return signed_url
+    
+    def _evict_urls(self, storage_paths: List[str]) -> None:
+        """Drop cached signed URLs for deleted files"""
+        paths = set(storage_paths)
+        with self._url_cache_lock:
+            for cache_key in [key for key in self._url_cache if key[0] in paths]:
+                self._url_cache.pop(cache_key, None)
     
     def download_file(self, storage_path: str) -> bytes:
         """
@@ -132,13 +167,13 @@ class StorageService:
             File content as bytes
         """
         try:
-            response = self.client.storage.from_(self.bucket).download(storage_path)
+            response = self._bucket_client.download(storage_path)
             if response:
                 return response
             else:
                 raise Exception("Download response was empty")
         except Exception as e:
-            logger.error(f"Failed to download file {storage_path}: {str(e)}")
+            logger.error("Failed to download file %s: %s", storage_path, e)
             raise
     
     def upload_page(self, page_bytes: bytes, job_id: str, page_number: int, file_extension: str = "png") -> str:
@@ -164,12 +199,19 @@ class StorageService:
     
     def delete_file(self, storage_path: str) -> bool:
         """Delete file from storage"""
+        return self.delete_files([storage_path])
+    
+    def delete_files(self, storage_paths: List[str]) -> bool:
+        """Delete several files from storage in a single request"""
+        if not storage_paths:
+            return True
+        self._evict_urls(storage_paths)
         try:
-            response = self.client.storage.from_(self.bucket).remove([storage_path])
-            logger.info(f"File deleted: {storage_path}")
+            self._bucket_client.remove(storage_paths)
+            logger.info("Deleted %d file(s): %s", len(storage_paths), ', '.join(storage_paths))
             return True
         except Exception as e:
-            logger.error(f"Failed to delete file: {str(e)}")
+            logger.error("Failed to delete files: %s", e)
             return False
 
 
@@ -0,0 +1,49 @@
+"""Service for extracting PO number and items from OCR payload in one pass"""
+from typing import List, Dict, Any, Optional, Tuple
+from app.services.po_extraction_service import po_extraction_service
+from app.services.items_extraction_service import items_extraction_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StructuredExtractionService:
+    """Service for extracting all structured fields the pipeline stores from an OCR payload"""
+
+    def extract(
+        self,
+        ocr_payload: Dict[str, Any],
+        log_prefix: str = ""
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+        """
+        Extract PO number and items from OCR payload.
+
+        A failure in one extraction is logged and does not prevent the other.
+
+        Args:
+            ocr_payload: OCR extracted data dictionary
+            log_prefix: Prefix for log messages (e.g. "[job_id] ")
+
+        Returns:
+            Tuple of (PO number or None, formatted items or None)
+        """
+        if not ocr_payload:
+            return None, None
+
+        po_number = None
+        try:
+            po_number = po_extraction_service.extract_po_number(ocr_payload)
+        except Exception as e:
+            logger.warning("%sFailed to extract PO number: %s", log_prefix, e)
+
+        items = None
+        try:
+            items = items_extraction_service.extract_items(ocr_payload)
+        except Exception as e:
+            logger.warning("%sFailed to extract items: %s", log_prefix, e)
+
+        return po_number, items
+
+
+# Singleton instance
+structured_extraction_service = StructuredExtractionService()
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_ready
 from app.core.config import settings
 import logging
 from urllib.parse import urlparse
@@ -19,16 +20,19 @@ logger = logging.getLogger(__name__)
 broker_url = settings.CELERY_BROKER_URL
 result_backend = settings.CELERY_RESULT_BACKEND
 
+
+def _clean_rediss_url(url: str) -> str:
+    """Remove query parameters from a rediss:// URL - Kombu will use transport_options for SSL config"""
+    parsed = urlparse(url)
+    return f"rediss://{parsed.netloc}{parsed.path}" if parsed.path else f"rediss://{parsed.netloc}"
+
+
 # SSL configuration for Upstash Redis (rediss://)
 broker_transport_options = {}
 result_backend_transport_options = {}
 
 if broker_url.startswith('rediss://'):
-    # Parse Redis URL for SSL configuration
-    parsed = urlparse(broker_url)
-    # Remove query parameters from URL - Kombu will use transport_options for SSL config
-    clean_broker_url = f"rediss://{parsed.netloc}{parsed.path}" if parsed.path else f"rediss://{parsed.netloc}"
-    broker_url = clean_broker_url
+    broker_url = _clean_rediss_url(broker_url)
     # Configure SSL for Kombu - Upstash requires specific SSL settings for serverless Redis
     broker_transport_options = {
         'ssl_cert_reqs': ssl.CERT_NONE,  # Disable SSL certificate verification for Upstash
@@ -39,16 +43,18 @@ if broker_url.startswith('rediss://'):
     logger.info("Configured Celery broker with SSL for Upstash Redis")
 
 if result_backend.startswith('rediss://'):
-    # Parse Redis URL for SSL configuration
-    parsed = urlparse(result_backend)
-    # Remove query parameters from URL
-    clean_result_backend = f"rediss://{parsed.netloc}{parsed.path}" if parsed.path else f"rediss://{parsed.netloc}"
-    result_backend = clean_result_backend
+    result_backend = _clean_rediss_url(result_backend)
     result_backend_transport_options = {
         'ssl_cert_reqs': ssl.CERT_NONE,  # Disable SSL certificate verification for Upstash
     }
     logger.info("Configured Celery result backend with SSL for Upstash Redis")
 
+# Fail fast on result backend writes instead of retrying indefinitely
+result_backend_transport_options = {
+    **result_backend_transport_options,
+    'retry_policy': {'timeout': 5.0},
+}
+
 # Create Celery app instance
 celery_app = Celery(
     "bill_processor",
@@ -59,16 +65,21 @@ celery_app = Celery(
 
 # Celery configuration
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],  # json kept so tasks queued before the switch still run
+    result_serializer="msgpack",
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes max per task
     task_soft_time_limit=25 * 60,  # 25 minutes soft limit
-    worker_prefetch_multiplier=1,
+    worker_prefetch_multiplier=1,  # OCR jobs are long-running; don't reserve tasks another worker could take
     worker_max_tasks_per_child=50,
+    # Keep broker/backend connections pooled and alive (TLS handshakes to Upstash are expensive)
+    broker_pool_limit=64,
+    broker_connection_retry_on_startup=True,
+    redis_socket_keepalive=True,
+    redis_max_connections=64,
     # SSL transport options for Upstash Redis
     broker_transport_options=broker_transport_options,
     result_backend_transport_options=result_backend_transport_options,
@@ -77,6 +88,8 @@ celery_app.conf.update(
     # Explicitly configure task routes and queues
     task_routes={
         'app.workers.tasks.process_job': {'queue': 'celery'},
+        'process_pages': {'queue': 'celery'},
+        'finalize_job': {'queue': 'celery'},
     },
     task_default_queue='celery',
     task_default_exchange='celery',
@@ -90,16 +103,19 @@ logger.info("Celery app configured successfully")
 logger.info(f"Broker URL: {broker_url[:30]}...")
 logger.info(f"Result backend: {result_backend[:30]}...")
 # #region agent log
-logger.info(f"[DEBUG-HYP-A] Worker startup - Full broker_url: {broker_url}")
-logger.info(f"[DEBUG-HYP-A] Worker startup - Full result_backend: {result_backend}")
-logger.info(f"[DEBUG-HYP-A] Worker startup - broker_transport_options: {broker_transport_options}")
-logger.info(f"[DEBUG-HYP-E] After URL cleanup - broker_url: {broker_url}")
-logger.info(f"[DEBUG-HYP-G] Worker listening on queue: celery (exchange=celery, routing_key=celery)")
-# Test broker connection
-try:
-    with celery_app.pool.acquire(block=True) as conn:
-        logger.info(f"[DEBUG-HYP-H] Broker connection test successful - conn: {conn}")
-except Exception as e:
-    logger.error(f"[DEBUG-HYP-H] Broker connection test FAILED: {str(e)}", exc_info=True)
+logger.debug("[DEBUG-HYP-A] Worker startup - Full broker_url: %s", broker_url)
+logger.debug("[DEBUG-HYP-A] Worker startup - Full result_backend: %s", result_backend)
+logger.debug("[DEBUG-HYP-A] Worker startup - broker_transport_options: %s", broker_transport_options)
+logger.debug("[DEBUG-HYP-G] Worker listening on queue: celery (exchange=celery, routing_key=celery)")
 # #endregion
 
+
+@worker_ready.connect
+def _check_broker_connection(sender, **kwargs):
+    """Test the broker connection once per worker (not on every import of this module)"""
+    try:
+        with celery_app.pool.acquire(block=True):
+            logger.info("Broker connection test successful")
+    except Exception as e:
+        logger.error("Broker connection test FAILED: %s", e, exc_info=True)
+
@@ -1,24 +1,371 @@
+from celery import chord
 from app.workers.celery_app import celery_app
+from app.core.config import settings
 from app.services.database import get_supabase_client
 from app.services.storage import storage_service
 from app.services.document_service import document_service
 from app.services.openai_service import openai_service
-from app.services.po_extraction_service import po_extraction_service
-from app.services.items_extraction_service import items_extraction_service
+from app.services.settings_service import settings_service
+from app.services.structured_extraction_service import structured_extraction_service
+from app.services.page_cache_service import page_cache_service, page_content_hash, PageResult
 from app.models.schemas import JobStatus, DocType, DocStatus
-from datetime import datetime
+from datetime import datetime, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import logging
+import threading
 import uuid
 import os
 
 logger = logging.getLogger(__name__)
 
-# Ensure logger is configured with INFO level
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+# Max OpenAI requests in flight per job (keeps us under API rate limits)
+OPENAI_CONCURRENCY = 8
+# Threads for blocking page I/O (storage uploads, Supabase inserts) run off the event loop
+PAGE_IO_WORKERS = 8
+# Pages per process_pages subtask; each subtask runs its pages through the async pipeline
+PAGES_PER_TASK = OPENAI_CONCURRENCY
+
+# (doc_type, doc_status) by classification result; anything else is unknown
+_CLASSIFICATION_MAP = {
+    'bill': (DocType.BILL, DocStatus.DRAFT_PENDING),
+    'eway_bill': (DocType.EWAY_BILL, DocStatus.DRAFT_PENDING),
+}
+
+_thread_local = threading.local()
+
+
+def _doc_id(job_id: str, page_number: int) -> str:
+    """Deterministic Doc id for a job's page, so a retried batch doesn't create duplicate rows"""
+    return str(uuid.uuid5(uuid.UUID(job_id), str(page_number)))
+
+
+async def _classify_and_ocr(
+    job_id: str,
+    file_name: str,
+    page_number: int,
+    page_bytes: bytes,
+    llm_settings: Dict[str, str]
+) -> Tuple[str, Optional[Dict[str, Any]], bool]:
+    """
+    Classify a page and, unless it is unknown, run OCR on it, with the prompts
+    and models from the given 'llm' settings snapshot.
+    
+    Returns:
+        Tuple of (classification, OCR payload or None, whether OCR succeeded or was not needed)
+    """
+    # Encode the page once and share it between classification and OCR.
+    # Pages are always rendered to PNG, whatever the uploaded file type was.
+    # The local classifier reads raw bytes, so then the page is only encoded if it needs OCR.
+    data_url = None
+    if settings.CLASSIFICATION_BACKEND != "local":
+        data_url = openai_service.build_data_url(page_bytes, "page.png")
+    
+    classification = await openai_service.classify_document(
+        page_bytes, file_name, data_url=data_url, llm_settings=llm_settings
+    )
+    logger.info("[%s] Page %s classified as: %s", job_id, page_number, classification)
+    
+    if classification not in _CLASSIFICATION_MAP:
+        return classification, None, True
+    
+    logger.info("[%s] Running OCR on page %s...", job_id, page_number)
+    if data_url is None:
+        data_url = openai_service.build_data_url(page_bytes, "page.png")
+    ocr_payload, ocr_succeeded = await openai_service.extract_ocr_data(
+        page_bytes, classification, file_name, data_url=data_url, llm_settings=llm_settings
+    )
+    logger.info("[%s] OCR completed for page %s", job_id, page_number)
+    return classification, ocr_payload, ocr_succeeded
+
+
+async def _process_page(
+    job_id: str,
+    user_id: str,
+    file_name: str,
+    page_number: int,
+    page_bytes: bytes,
+    page_storage_path: str,
+    total_pages: int,
+    semaphore: asyncio.Semaphore,
+    llm_settings: Dict[str, str],
+    cached: Optional[PageResult] = None
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[str], Optional[PageResult]]:
+    """
+    Classify and OCR a single (already uploaded) page, and build its Doc row.
+    
+    Errors produce an error Doc row rather than being raised so that
+    one failed page does not abort the other pages of the job. A cached
+    (classification, ocr_payload) result skips both OpenAI calls.
+    
+    Returns:
+        Tuple of (Doc row or None, error Doc row or None, classification error message or None,
+        freshly computed result to cache or None)
+    """
+    logger.info("[%s] Processing page %s/%s", job_id, page_number, total_pages)
+    
+    try:
+        # The page holds one OpenAI slot from classification through OCR, so pages
+        # pipeline (one page's OCR overlaps the next page's classification) and only
+        # OPENAI_CONCURRENCY base64-encoded pages are held in memory at a time
+        if cached is not None:
+            classification, ocr_payload = cached
+            store_in_cache = False
+            logger.info("[%s] Page %s found in page cache as: %s", job_id, page_number, classification)
+        else:
+            # Failed OCR is not cached, so the page is retried next time
+            async with semaphore:
+                classification, ocr_payload, store_in_cache = await _classify_and_ocr(
+                    job_id, file_name, page_number, page_bytes, llm_settings
+                )
+        # This task holds the only reference to the page image; free it before extraction
+        del page_bytes
+        
+        # Determine doc_type and status
+        doc_type, doc_status = _CLASSIFICATION_MAP.get(classification, (DocType.UNKNOWN, DocStatus.UNKNOWN))
+        
+        extracted_po_number = None
+        extracted_items = None
+        if ocr_payload:
+            # Extract PO number and items from OCR payload
+            extracted_po_number, extracted_items = structured_extraction_service.extract(
+                ocr_payload, log_prefix=f"[{job_id}] "
+            )
+            if extracted_po_number:
+                logger.info("[%s] Extracted PO number: %s", job_id, extracted_po_number)
+            else:
+                logger.info("[%s] No PO number found in OCR payload", job_id)
+            if extracted_items:
+                logger.info("[%s] Extracted %s items from OCR payload", job_id, len(extracted_items))
+            else:
+                logger.info("[%s] No items found in OCR payload", job_id)
+        
+        # Doc record (inserted with the rest of the job's pages)
+        now = datetime.now(timezone.utc).isoformat()
+        doc_data = {
+            "id": _doc_id(job_id, page_number),
+            "job_thread_id": job_id,
+            "user_id": user_id,
+            "page_number": page_number,
+            "doc_type": doc_type.value,
+            "status": doc_status.value,
+            "ocr_payload": ocr_payload,
+            "po_number": extracted_po_number,  # Extracted PO number
+            "items": extracted_items,  # Extracted and formatted items
+            "storage_uri": page_storage_path,
+            "created_at": now,
+            "updated_at": now
+        }
+        cache_result = (doc_type.value, ocr_payload) if store_in_cache else None
+        return doc_data, None, None, cache_result
+        
+    except Exception as page_error:
+        error_msg = str(page_error)
+        # Tracebacks only at DEBUG: with many failing pages, formatting them dominates the failure path
+        logger.error("[%s] Error processing page %s: %s", job_id, page_number, error_msg, exc_info=logger.isEnabledFor(logging.DEBUG))
+        
+        # Store classification errors for reporting
+        classification_error = None
+        if "classification" in error_msg.lower() or "prompt" in error_msg.lower():
+            classification_error = f"Page {page_number}: {error_msg}"
+        
+        # Doc record with error status for failed pages (the page image is already uploaded, so link it)
+        now = datetime.now(timezone.utc).isoformat()
+        error_data = {
+            "id": _doc_id(job_id, page_number),
+            "job_thread_id": job_id,
+            "user_id": user_id,
+            "page_number": page_number,
+            "doc_type": DocType.UNKNOWN.value,
+            "status": DocStatus.UNKNOWN.value,
+            "ocr_payload": {"error": error_msg},
+            "po_number": None,
+            "items": None,
+            "storage_uri": page_storage_path,
+            "created_at": now,
+            "updated_at": now
+        }
+        return None, error_data, classification_error, None
+
+
+async def _insert_docs(supabase, job_id: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insert Doc rows in one request, falling back to one insert per row if the
+    batch fails so that a single bad row doesn't lose the others.
+    
+    Rows are upserted by id, so rows left by an earlier attempt of a retried
+    batch are replaced rather than duplicated.
+    
+    Returns:
+        Created rows
+    
+    Raises:
+        Exception: If the batch failed and no row could be inserted on its own either
+    """
+    if not rows:
+        return []
+    
+    try:
+        result = await asyncio.to_thread(supabase.table("docs").upsert(rows).execute)
+        return result.data or []
+    except Exception as batch_error:
+        logger.error("[%s] Batch Doc insert failed, inserting rows individually: %s", job_id, batch_error)
+        
+        async def insert_row(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+            try:
+                result = await asyncio.to_thread(supabase.table("docs").upsert(row).execute)
+                return result.data or []
+            except Exception as row_error:
+                logger.error("[%s] Failed to create Doc record for page %s: %s", job_id, row['page_number'], row_error)
+                return []
+        
+        created = [row for rows_created in await asyncio.gather(*map(insert_row, rows)) for row in rows_created]
+        if not created:
+            raise batch_error
+        return created
+
+
+async def _process_pages(
+    supabase,
+    job_id: str,
+    user_id: str,
+    file_name: str,
+    pages: List[Tuple[int, str]],
+    total_pages: int,
+    page_bytes_list: Optional[List[bytes]] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Process a batch of uploaded pages concurrently, bounding the number of in-flight
+    OpenAI calls, then insert their Doc records in one request per row shape.
+    
+    Args:
+        pages: List of (page_number, storage_path)
+        total_pages: Number of pages in the whole job (for logging)
+        page_bytes_list: Page images already in memory, in the same order as pages
+            (downloaded from storage if not given). The list is emptied once the
+            pages are handed to their tasks.
+    
+    Returns:
+        Tuple of (created doc ids, classification error messages)
+    """
+    if page_bytes_list is None:
+        page_bytes_list = await asyncio.gather(*[
+            asyncio.to_thread(storage_service.download_file, storage_path)
+            for _, storage_path in pages
+        ])
+    
+    # Reuse results for pages already classified/OCR'd with the current prompts and models.
+    # The whole batch uses one settings snapshot, so results are always stored under the
+    # fingerprint of the prompts that actually produced them.
+    llm_settings = await asyncio.to_thread(settings_service.get_category_settings, "llm")
+    prompt_version = openai_service.prompt_version(llm_settings)
+    content_hashes = [page_content_hash(page_bytes) for page_bytes in page_bytes_list]
+    cached = await asyncio.to_thread(page_cache_service.get_many, content_hashes, prompt_version)
+    if cached:
+        logger.info("[%s] Page cache hits: %s/%s", job_id, len(cached), len(pages))
+    
+    # Each page task becomes the only owner of its image, so a page's bytes are
+    # released as soon as it finishes instead of when the whole batch does
+    semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    page_inputs = deque(zip(pages, page_bytes_list, content_hashes))
+    page_bytes_list.clear()
+    page_tasks = []
+    while page_inputs:
+        (page_number, storage_path), page_bytes, content_hash = page_inputs.popleft()
+        page_tasks.append(_process_page(
+            job_id, user_id, file_name, page_number, page_bytes, storage_path,
+            total_pages, semaphore, llm_settings, cached.get(content_hash)
+        ))
+        del page_bytes
+    results = await asyncio.gather(*page_tasks)
+    
+    doc_records = []
+    classification_errors = []
+    doc_rows = []
+    error_rows = []
+    fresh_results = {}
+    for content_hash, (doc_data, error_data, classification_error, cache_result) in zip(content_hashes, results):
+        if doc_data:
+            doc_rows.append(doc_data)
+        if error_data:
+            error_rows.append(error_data)
+        if classification_error:
+            classification_errors.append(classification_error)
+        if cache_result:
+            fresh_results[content_hash] = cache_result
+    
+    # Successful and error rows share columns, so they go in a single bulk insert
+    created = await _insert_docs(supabase, job_id, doc_rows + error_rows)
+    doc_ids = {row["id"] for row in doc_rows}
+    doc_records.extend(row["id"] for row in created if row["id"] in doc_ids)
+    logger.info("[%s] Created %s Doc records and %s error Doc records", job_id, len(doc_records), len(created) - len(doc_records))
+    if len(doc_records) < len(doc_rows):
+        logger.error("[%s] Failed to create %s Doc records", job_id, len(doc_rows) - len(doc_records))
+    
+    # Cache fresh successful results (failed pages and OCR errors are retried next time)
+    await asyncio.to_thread(page_cache_service.put_many, fresh_results, prompt_version)
+    
+    return doc_records, classification_errors
+
+
+def _run_async(coro):
+    """
+    Run a coroutine on this worker thread's event loop.
+    
+    The loop is kept for the life of the worker thread because openai_service
+    keeps one AsyncOpenAI client per loop, whose pooled connections are bound
+    to that loop. Each thread has its own loop, so this is safe under threaded
+    worker pools as well as the solo pool used in deployment. The loop's
+    default executor (used by asyncio.to_thread) is sized for page uploads
+    and inserts so they overlap across pages.
+    """
+    loop = getattr(_thread_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=PAGE_IO_WORKERS, thread_name_prefix="page-io"))
+        _thread_local.loop = loop
+    return loop.run_until_complete(coro)
+
+
+def _mark_job_error(supabase, job_id: str, error: Exception):
+    """Set the job status to error"""
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        supabase.table("job_threads").update({
+            "status": JobStatus.ERROR.value,
+            "error_message": str(error),
+            "failed_at": now,
+            "updated_at": now
+        }).eq("id", job_id).execute()
+    except Exception as update_error:
+        logger.error(f"[{job_id}] Failed to update error status: {str(update_error)}")
+
+
+def _finalize_job(supabase, job_id: str, doc_records: List[str], classification_errors: List[str]):
+    """Update job status to processed, reporting any classification errors"""
+    logger.info(f"[{job_id}] Processing complete. Created {len(doc_records)} Doc records")
+    
+    # If there were classification errors, add them to error_message
+    error_message = None
+    if classification_errors:
+        error_message = f"Classification errors on some pages: {'; '.join(classification_errors)}"
+        logger.warning(f"[{job_id}] {error_message}")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    update_data = {
+        "status": JobStatus.PROCESSED.value,
+        "completed_at": now,
+        "updated_at": now
+    }
+    
+    if error_message:
+        update_data["error_message"] = error_message
+    
+    supabase.table("job_threads").update(update_data).eq("id", job_id).execute()
+    
+    logger.info(f"[{job_id}] Job completed successfully")
 
 
 @celery_app.task(bind=True, name="process_job", max_retries=3)
@@ -28,29 +375,31 @@ def process_job_task(self, job_id: str):
     
     Full Phase 2 implementation:
     1. Fetch job details and file from storage
-    2. Split document into pages
-    3. Classify each page (bill/eway_bill/unknown)
-    4. Run OCR on each classified page
-    5. Save Doc records for each page
-    6. Update job status
+    2. Split document into pages and upload the page images
+    3. Fan out batches of pages to process_pages subtasks, which classify each
+       page (bill/eway_bill/unknown), run OCR on classified pages and save Doc records
+    4. finalize_job updates the job status once every batch is done
     
     Args:
         job_id: ID of the job thread to process
     """
     # #region agent log
     task_id = self.request.id if hasattr(self.request, 'id') else None
-    logger.info(f"[DEBUG-HYP-D] Task received by worker - job_id: {job_id}, task_id: {task_id}")
+    logger.debug("[DEBUG-HYP-D] Task received by worker - job_id: %s, task_id: %s", job_id, task_id)
     # #endregion
-    # Use both logger and print to ensure visibility
-    message = f"[{job_id}] Starting job processing"
-    logger.info(message)
-    print(message)  # Also print to ensure it's visible
+    logger.info(f"[{job_id}] Starting job processing")
     
     supabase = get_supabase_client()
     
     try:
-        # Fetch job details
-        job_result = supabase.table("job_threads").select("*").eq("id", job_id).execute()
+        # Update job status to processing; the update returns the job row, so
+        # fetching the job details takes no separate round-trip
+        now = datetime.now(timezone.utc).isoformat()
+        job_result = supabase.table("job_threads").update({
+            "status": JobStatus.PROCESSING.value,
+            "started_at": now,
+            "updated_at": now
+        }).eq("id", job_id).execute()
         
         if not job_result.data:
             raise Exception(f"Job {job_id} not found")
@@ -63,213 +412,121 @@ def process_job_task(self, job_id: str):
         if not storage_path:
             raise Exception(f"No storage_path found for job {job_id}")
         
-        message = f"[{job_id}] Processing file: {file_name} from {storage_path}"
-        logger.info(message)
-        print(message)
-        
-        # Update job status to processing
-        supabase.table("job_threads").update({
-            "status": JobStatus.PROCESSING.value,
-            "started_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", job_id).execute()
+        logger.info(f"[{job_id}] Processing file: {file_name} from {storage_path}")
         
         # Download file from storage
-        message = f"[{job_id}] Downloading file from storage..."
-        logger.info(message)
-        print(message)
+        logger.info(f"[{job_id}] Downloading file from storage...")
         file_bytes = storage_service.download_file(storage_path)
-        message = f"[{job_id}] Downloaded {len(file_bytes)} bytes"
-        logger.info(message)
-        print(message)
+        logger.info(f"[{job_id}] Downloaded {len(file_bytes)} bytes")
         
         # Get file extension
         file_ext = os.path.splitext(file_name)[1].lower()
         if not file_ext:
             file_ext = ".pdf"  # Default to PDF if no extension
         
-        # Split document into pages
-        message = f"[{job_id}] Splitting document into pages..."
-        logger.info(message)
-        print(message)
-        pages = document_service.get_image_bytes_for_classification(file_bytes, file_ext)
-        message = f"[{job_id}] Split into {len(pages)} pages"
-        logger.info(message)
-        print(message)
-        
-        # Process each page
-        doc_records = []
-        classification_errors = []
-        
-        for page_number, page_bytes in pages:
-            logger.info(f"[{job_id}] Processing page {page_number}/{len(pages)}")
-            
-            try:
-                # Classify the page
-                classification = openai_service.classify_document(page_bytes, file_name)
-                logger.info(f"[{job_id}] Page {page_number} classified as: {classification}")
-                print(f"[{job_id}] Page {page_number} classified as: {classification}")
-                
-                # Determine doc_type and status
-                if classification == 'bill':
-                    doc_type = DocType.BILL
-                    doc_status = DocStatus.DRAFT_PENDING
-                elif classification == 'eway_bill':
-                    doc_type = DocType.EWAY_BILL
-                    doc_status = DocStatus.DRAFT_PENDING
-                else:
-                    doc_type = DocType.UNKNOWN
-                    doc_status = DocStatus.UNKNOWN
-                
-                # Run OCR if not unknown
-                ocr_payload = None
-                extracted_po_number = None
-                if doc_type != DocType.UNKNOWN:
-                    logger.info(f"[{job_id}] Running OCR on page {page_number}...")
-                    print(f"[{job_id}] Running OCR on page {page_number}...")
-                    ocr_payload = openai_service.extract_ocr_data(page_bytes, classification, file_name)
-                    logger.info(f"[{job_id}] OCR completed for page {page_number}")
-                    print(f"[{job_id}] OCR completed for page {page_number}")
-                    
-                    # Extract PO number and items from OCR payload
-                    extracted_items = None
-                    extracted_po_number = None
-                    if ocr_payload:
-                        try:
-                            extracted_po_number = po_extraction_service.extract_po_number(ocr_payload)
-                            if extracted_po_number:
-                                logger.info(f"[{job_id}] Extracted PO number: {extracted_po_number}")
-                                print(f"[{job_id}] Extracted PO number: {extracted_po_number}")
-                            else:
-                                logger.info(f"[{job_id}] No PO number found in OCR payload")
-                                print(f"[{job_id}] No PO number found in OCR payload")
-                        except Exception as po_extract_error:
-                            logger.warning(f"[{job_id}] Failed to extract PO number: {str(po_extract_error)}")
-                            print(f"[{job_id}] Failed to extract PO number: {str(po_extract_error)}")
-                        
-                        # Extract items from OCR payload
-                        try:
-                            extracted_items = items_extraction_service.extract_items(ocr_payload)
-                            if extracted_items:
-                                logger.info(f"[{job_id}] Extracted {len(extracted_items)} items from OCR payload")
-                                print(f"[{job_id}] Extracted {len(extracted_items)} items from OCR payload")
-                            else:
-                                logger.info(f"[{job_id}] No items found in OCR payload")
-                                print(f"[{job_id}] No items found in OCR payload")
-                        except Exception as items_extract_error:
-                            logger.warning(f"[{job_id}] Failed to extract items: {str(items_extract_error)}")
-                            print(f"[{job_id}] Failed to extract items: {str(items_extract_error)}")
-                
-                # Upload page image to storage
-                page_storage_path = storage_service.upload_page(
-                    page_bytes=page_bytes,
-                    job_id=job_id,
-                    page_number=page_number,
-                    file_extension="png"
+        # Split document into pages, uploading each page as soon as it is rendered
+        # (subtasks get storage paths so page bytes never go through the broker)
+        logger.info(f"[{job_id}] Splitting document into pages...")
+        # Page bytes are also kept while the job still fits in a single batch
+        uploads = []
+        small_job_pages: Optional[List[bytes]] = []
+        with ThreadPoolExecutor(max_workers=PAGE_IO_WORKERS) as executor:
+            for page_number, page_bytes in document_service.iter_image_bytes_for_classification(file_bytes, file_ext):
+                uploads.append(
+                    (page_number, executor.submit(storage_service.upload_page, page_bytes, job_id, page_number, "png"))
                 )
-                logger.info(f"[{job_id}] Page {page_number} uploaded to: {page_storage_path}")
-                print(f"[{job_id}] Page {page_number} uploaded to: {page_storage_path}")
-                
-                # Create Doc record
-                doc_id = str(uuid.uuid4())
-                doc_data = {
-                    "id": doc_id,
-                    "job_thread_id": job_id,
-                    "user_id": user_id,
-                    "page_number": page_number,
-                    "doc_type": doc_type.value,
-                    "status": doc_status.value,
-                    "ocr_payload": ocr_payload,
-                    "po_number": extracted_po_number,  # Extracted PO number
-                    "items": extracted_items,  # Extracted and formatted items
-                    "storage_uri": page_storage_path,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-                
-                result = supabase.table("docs").insert(doc_data).execute()
-                
-                if result.data:
-                    doc_records.append(doc_id)
-                    logger.info(f"[{job_id}] Created Doc record {doc_id} for page {page_number}")
-                else:
-                    logger.error(f"[{job_id}] Failed to create Doc record for page {page_number}")
-                
-            except Exception as page_error:
-                error_msg = str(page_error)
-                logger.error(f"[{job_id}] Error processing page {page_number}: {error_msg}", exc_info=True)
-                print(f"[{job_id}] Error processing page {page_number}: {error_msg}")
-                
-                # Store classification errors for reporting
-                if "classification" in error_msg.lower() or "prompt" in error_msg.lower():
-                    classification_errors.append(f"Page {page_number}: {error_msg}")
-                
-                # Create a Doc record with error status for failed pages
-                try:
-                    doc_id = str(uuid.uuid4())
-                    doc_data = {
-                        "id": doc_id,
-                        "job_thread_id": job_id,
-                        "user_id": user_id,
-                        "page_number": page_number,
-                        "doc_type": DocType.UNKNOWN.value,
-                        "status": DocStatus.UNKNOWN.value,
-                        "ocr_payload": {"error": error_msg},
-                        "storage_uri": None,
-                        "created_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                    
-                    result = supabase.table("docs").insert(doc_data).execute()
-                    if result.data:
-                        logger.info(f"[{job_id}] Created error Doc record {doc_id} for page {page_number}")
-                except Exception as doc_error:
-                    logger.error(f"[{job_id}] Failed to create error doc record: {str(doc_error)}")
-                
-                # Continue processing other pages
-                continue
-        
-        # Update job status to processed
-        message = f"[{job_id}] Processing complete. Created {len(doc_records)} Doc records"
-        logger.info(message)
-        print(message)
+                if small_job_pages is not None:
+                    small_job_pages.append(page_bytes)
+                    if len(small_job_pages) > PAGES_PER_TASK:
+                        small_job_pages = None
+            page_refs = [[page_number, upload.result()] for page_number, upload in uploads]
+        # The source file is not needed past this point
+        del file_bytes
+        logger.info(f"[{job_id}] Split into {len(page_refs)} pages")
         
-        # If there were classification errors, add them to error_message
-        error_message = None
-        if classification_errors:
-            error_message = f"Classification errors on some pages: {'; '.join(classification_errors)}"
-            logger.warning(f"[{job_id}] {error_message}")
-            print(f"[{job_id}] {error_message}")
+        # Fast path for jobs that fit in one batch (most uploads are a single invoice page):
+        # process inline, skipping the chord round-trips and re-downloading the pages
+        if small_job_pages is not None:
+            doc_records, classification_errors = _run_async(_process_pages(
+                supabase, job_id, user_id, file_name,
+                [(page_number, path) for page_number, path in page_refs],
+                len(page_refs),
+                page_bytes_list=small_job_pages
+            ))
+            _finalize_job(supabase, job_id, doc_records, classification_errors)
+            return
         
-        update_data = {
-            "status": JobStatus.PROCESSED.value,
-            "completed_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        
-        if error_message:
-            update_data["error_message"] = error_message
+        # Fan out page batches across workers; finalize_job runs once all of them finish
+        batches = [page_refs[i:i + PAGES_PER_TASK] for i in range(0, len(page_refs), PAGES_PER_TASK)]
+        chord(
+            process_pages_task.s(job_id, user_id, file_name, batch, len(page_refs))
+            for batch in batches
+        )(finalize_job_task.s(job_id))
         
-        supabase.table("job_threads").update(update_data).eq("id", job_id).execute()
-        
-        message = f"[{job_id}] Job completed successfully"
-        logger.info(message)
-        print(message)
+        logger.info(f"[{job_id}] Dispatched {len(page_refs)} pages in {len(batches)} batches")
         
     except Exception as e:
         logger.error(f"[{job_id}] Job processing failed: {str(e)}", exc_info=True)
         
         # Update job status to error
-        try:
-            supabase.table("job_threads").update({
-                "status": JobStatus.ERROR.value,
-                "error_message": str(e),
-                "failed_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", job_id).execute()
-        except Exception as update_error:
-            logger.error(f"[{job_id}] Failed to update error status: {str(update_error)}")
+        _mark_job_error(supabase, job_id, e)
         
         # Re-raise to trigger Celery retry if configured
         raise
 
+
+@celery_app.task(bind=True, name="process_pages", autoretry_for=(Exception,), max_retries=3, retry_backoff=True)
+def process_pages_task(self, job_id: str, user_id: str, file_name: str, pages: List[List], total_pages: int):
+    """
+    Classify, OCR and record a batch of a job's pages.
+    
+    A failed batch is retried on its own; Doc ids are derived from the page
+    number, so rows saved by an earlier attempt are not duplicated.
+    
+    Args:
+        job_id: ID of the job thread
+        user_id: Owner of the job
+        file_name: Original file name
+        pages: List of [page_number, storage_path]
+        total_pages: Number of pages in the whole job
+    
+    Returns:
+        Dictionary with created doc_ids and classification_errors, for finalize_job
+    """
+    supabase = get_supabase_client()
+    
+    try:
+        doc_records, classification_errors = _run_async(_process_pages(
+            supabase, job_id, user_id, file_name,
+            [(page_number, storage_path) for page_number, storage_path in pages],
+            total_pages
+        ))
+        return {"doc_ids": doc_records, "classification_errors": classification_errors}
+    except Exception as e:
+        logger.error(f"[{job_id}] Page batch processing failed (attempt {self.request.retries + 1}): {str(e)}", exc_info=True)
+        # Once retries are exhausted the chord callback won't run, so record the failure on the job here
+        if self.request.retries >= self.max_retries:
+            _mark_job_error(supabase, job_id, e)
+        raise
+
+
+@celery_app.task(bind=True, name="finalize_job", max_retries=3)
+def finalize_job_task(self, results: List[Dict[str, Any]], job_id: str):
+    """
+    Aggregate process_pages results and mark the job processed.
+    
+    Args:
+        results: Return values of the job's process_pages subtasks
+        job_id: ID of the job thread
+    """
+    supabase = get_supabase_client()
+    
+    doc_records = [doc_id for result in results for doc_id in result["doc_ids"]]
+    classification_errors = [error for result in results for error in result["classification_errors"]]
+    
+    try:
+        _finalize_job(supabase, job_id, doc_records, classification_errors)
+    except Exception as e:
+        logger.error(f"[{job_id}] Job finalization failed: {str(e)}", exc_info=True)
+        _mark_job_error(supabase, job_id, e)
+        raise
@@ -0,0 +1,15 @@
+-- Migration: 006_add_doc_page_cache.sql
+-- Description: Add doc_page_cache table for reusing classification/OCR results of identical pages
+
+-- Results are keyed by page image hash and a fingerprint of the prompts/models used
+CREATE TABLE IF NOT EXISTS doc_page_cache (
+    content_sha256 VARCHAR(64) NOT NULL,
+    prompt_version VARCHAR(64) NOT NULL,
+    classification VARCHAR(50) NOT NULL,
+    ocr_payload JSONB,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (content_sha256, prompt_version)
+);
+
+-- Cached OCR output is shared across users, so only the service role may access it (no policies)
+ALTER TABLE doc_page_cache ENABLE ROW LEVEL SECURITY;